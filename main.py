@@ -10,77 +10,158 @@ lights to match the dominant colors.
 import logging
 import os
 import sys
-import time
+import signal
+import threading
 import argparse
+import hashlib
 from configparser import ConfigParser
-import socket
 
-# Add the src directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from src.wallpaper_capture import WallpaperCapture
-from src.color_analyzer import ColorAnalyzer
-from src.light_controller import LightController
-from src.utils import setup_logging
+# Application root directory and the files the application uses under it
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_PATH = os.path.join(ROOT_DIR, 'logs', 'app.log')
+CONFIG_PATH = os.path.join(ROOT_DIR, 'config', 'config.ini')
 
 
 def load_config():
     """Load configuration from config.ini file"""
     config = ConfigParser()
-    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'config.ini')
     
-    if not os.path.exists(config_path):
-        logging.error(f"Configuration file not found: {config_path}")
+    if not os.path.exists(CONFIG_PATH):
+        logging.error(f"Configuration file not found: {CONFIG_PATH}")
         sys.exit(1)
         
-    config.read(config_path)
+    config.read(CONFIG_PATH)
     return config
 
 
+def save_config(config):
+    """Write the configuration back to config.ini"""
+    try:
+        with open(CONFIG_PATH, 'w') as f:
+            config.write(f)
+    except OSError as e:
+        logging.error(f"Error saving configuration: {e}")
+
+
+def image_digest(image):
+    """
+    Compute a short digest of a downscaled copy of the image, so that
+    unchanged wallpapers can be detected without re-analyzing them
+    
+    Args:
+        image: PIL.Image object to hash
+        
+    Returns:
+        bytes: 8-byte digest of the image
+    """
+    thumbnail = image.resize((32, 32))
+    return hashlib.blake2b(thumbnail.tobytes(), digest_size=8).digest()
+
+
 def run_cli_mode():
     """Run the application in command-line mode"""
+    # Import the heavy modules (numpy, scikit-learn, PIL) only when needed
+    from src.wallpaper_capture import WallpaperCapture
+    from src.color_analyzer import ColorAnalyzer
+    from src.light_controller import LightController
+    from src.utils import setup_logging
+    
     # Setup logging
-    log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'app.log')
-    setup_logging(log_path)
+    setup_logging(LOG_PATH)
     
     logging.info("Starting Wallpaper Light application (CLI mode)")
     
     # Load configuration
     config = load_config()
     
-    # Set socket timeout for network operations
-    socket.setdefaulttimeout(30)  # Increase timeout to 30 seconds
+    # Waiting on an event instead of sleeping lets Ctrl-C stop the loop promptly
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
     
     # Initialize components
     try:
-        wallpaper_capture = WallpaperCapture(config)
         color_analyzer = ColorAnalyzer(config)
+        # The analyzer only needs a small image, so decode wallpapers at a reduced scale
+        wallpaper_capture = WallpaperCapture(
+            config,
+            draft_size=(color_analyzer.resize_width, color_analyzer.resize_height)
+        )
         light_controller = LightController(config)
         
+        # Keep newly discovered lights for the next start
+        if light_controller.cache_updated:
+            save_config(config)
+        
         update_interval = config.getint('General', 'update_interval', fallback=60)
+        force_refresh_ticks = config.getint('General', 'force_refresh_ticks', fallback=30)
         
         logging.info(f"Application initialized with update interval of {update_interval} seconds")
         
+        last_digest = None
+        last_colors = None
+        pending_colors = None
+        force_send = False
+        ticks_since_refresh = 0
+        failures = 0
+        
+        def retry_later(stage, error):
+            """Log a failed stage and back off exponentially before retrying"""
+            nonlocal failures
+            failures += 1
+            delay = min(60, 2 ** failures)
+            logging.error(f"Error {stage}: {error} (retrying in {delay} seconds)")
+            stop_event.wait(delay)
+        
         # Main loop
-        while True:
+        while not stop_event.is_set():
+            # Capture current wallpaper
             try:
-                # Capture current wallpaper
                 wallpaper_image = wallpaper_capture.capture()
-                
-                # Analyze colors
-                dominant_colors = color_analyzer.analyze(wallpaper_image)
-                
-                # Control lights based on colors
-                light_controller.set_colors(dominant_colors)
-                
-                logging.info(f"Updated lights with colors: {dominant_colors}")
-                
-                # Wait for next update
-                time.sleep(update_interval)
-                
             except Exception as e:
-                logging.error(f"Error in main loop: {e}")
-                time.sleep(10)  # Wait a bit before retrying
+                retry_later("capturing wallpaper", e)
+                continue
+            
+            # Only analyze if the image changed, but still refresh the lights
+            # every few ticks in case they were changed elsewhere
+            ticks_since_refresh += 1
+            try:
+                digest = image_digest(wallpaper_image)
+                if digest != last_digest or ticks_since_refresh >= force_refresh_ticks:
+                    pending_colors = color_analyzer.analyze(wallpaper_image)
+                    force_send = ticks_since_refresh >= force_refresh_ticks
+                    last_digest = digest
+                    ticks_since_refresh = 0
+            except Exception as e:
+                retry_later("analyzing colors", e)
+                continue
+            
+            # Control lights based on colors; if this fails the same colors
+            # are retried next time without re-analyzing the image
+            if pending_colors is not None:
+                try:
+                    light_controller.set_colors(pending_colors, force=force_send)
+                except Exception as e:
+                    retry_later("setting light colors", e)
+                    continue
+                logging.info(f"Updated lights with colors: {pending_colors}")
+                last_colors, pending_colors = pending_colors, None
+            elif last_colors is not None:
+                # Wallpaper unchanged: resend the last colors anyway. Only lights
+                # whose last command failed get one, so failures are retried
+                # every tick and a steady scene sends nothing
+                logging.debug("Wallpaper unchanged, retrying any lights that failed")
+                try:
+                    light_controller.set_colors(last_colors)
+                except Exception as e:
+                    retry_later("setting light colors", e)
+                    continue
+            
+            # Wait for next update
+            failures = 0
+            stop_event.wait(update_interval)
+        
+        logging.info("Stopping Wallpaper Light application")
+        light_controller.close()
                 
     except Exception as e:
         logging.critical(f"Failed to initialize application: {e}")
@@ -3,17 +3,13 @@
 Simple test script for the Wallpaper Light application
 """
 import os
-import sys
 import logging
 from configparser import ConfigParser
 
-# Add the src directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from src.utils import setup_logging
-
 def main():
     """Test the application components"""
+    from src.utils import setup_logging
+    
     # Setup logging
     log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'test.log')
     os.makedirs(os.path.dirname(log_path), exist_ok=True)
@@ -1,16 +1,39 @@
 """
 Module for analyzing colors in images using AI-based approaches
 """
+import itertools
 import logging
+import random
+import threading
 import numpy as np
 from PIL import Image
-from sklearn.cluster import KMeans
-import colorsys
+from sklearn.cluster import MiniBatchKMeans
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Number of hue steps in the HSV to RGB lookup table (six sectors of 256)
+_HUE_LUT_SIZE = 1536
+
+# Numba's default threading layer can't run parallel kernels from several
+# threads at once, so calls into the k-means kernel are serialized
+_KMEANS_KERNEL_LOCK = threading.Lock()
+
+# Initial "no center yet" distance in the k-means kernel; finite because
+# fastmath lets LLVM assume infinities never occur
+_FAR_DISTANCE = np.finfo(np.float64).max
 
 
 class ColorAnalyzer:
     """Class to analyze colors in images using AI techniques"""
     
+    # Harmony models and the weights they are randomly chosen with
+    _HARMONY_MODELS = ('complementary', 'analogous', 'triadic', 'tetradic', 'monochromatic')
+    _HARMONY_WEIGHTS = (0.2, 0.3, 0.2, 0.1, 0.2)
+    
     def __init__(self, config):
         """
         Initialize the color analyzer
@@ -26,8 +49,46 @@ class ColorAnalyzer:
         self.color_harmony = config.getboolean('ColorAnalyzer', 'color_harmony', fallback=True)
         self.brightness_threshold = config.getfloat('ColorAnalyzer', 'brightness_threshold', fallback=0.1)
         self.saturation_threshold = config.getfloat('ColorAnalyzer', 'saturation_threshold', fallback=0.1)
+        self.batch_size = config.getint('ColorAnalyzer', 'batch_size', fallback=1024)
+        
+        # Resolve the algorithm once instead of comparing strings every frame
+        algorithms = {
+            'kmeans': self._kmeans_clustering,
+            'quantile': self._quantile_based,
+            'histogram': self._histogram_based,
+        }
+        if self.algorithm.lower() not in algorithms:
+            logging.warning(f"Unknown algorithm: {self.algorithm}, falling back to K-means")
+        self._algorithm_fn = algorithms.get(self.algorithm.lower(), self._kmeans_clustering)
+        
+        # The histogram works on the whole image; the other algorithms only
+        # look at pixels that aren't too dark, too light or too grey
+        self._filter_input = self.algorithm.lower() != 'histogram'
+        
+        # Number of pixels analyzed per image, and per-thread buffers for
+        # quantizing them so concurrent analyze() calls don't share arrays
+        self._npix = self.resize_width * self.resize_height
+        self._buffers = threading.local()
+        
+        # Pure (S = V = 1) color of each hue step, for table-based HSV to RGB
+        lut_hues = np.arange(_HUE_LUT_SIZE) / _HUE_LUT_SIZE
+        self._hue_lut = _hsv_to_rgb_np(np.stack([lut_hues, np.ones(_HUE_LUT_SIZE), np.ones(_HUE_LUT_SIZE)], axis=1))
+        
+        # Dedicated generator and cumulative weights for picking harmony models
+        self._rng = random.Random()
+        self._harmony_cum_weights = list(itertools.accumulate(self._HARMONY_WEIGHTS))
         
         logging.info(f"Initializing AI-based color analyzer to extract {self.num_colors} colors using {self.algorithm}")
+        
+        # Compile (or load from cache) the Numba kernel up front. Doing it
+        # lazily would put the JIT stall on the first update, and compiling
+        # from a worker thread such as the GUI's update loop can hang
+        # Numba's thread pool at interpreter exit.
+        if NUMBA_AVAILABLE and self._algorithm_fn == self._kmeans_clustering:
+            try:
+                _kmeans_d3_numba.compile('(int64[:, ::1], float64[::1], int64, int64, int64)')
+            except Exception as e:
+                logging.warning(f"Failed to compile Numba k-means kernel: {e}")
     
     def analyze(self, image):
         """
@@ -39,35 +100,19 @@ class ColorAnalyzer:
         Returns:
             list: List of dominant colors as (R, G, B) tuples
         """
-        # Resize image for faster processing
-        resized_image = image.resize((self.resize_width, self.resize_height))
-        
-        # Convert to RGB if needed
-        if resized_image.mode != 'RGB':
-            resized_image = resized_image.convert('RGB')
-        
-        # Convert to numpy array
-        np_image = np.array(resized_image)
-        pixels = np_image.reshape(-1, 3)
+        # Convert to RGB first so resizing only works on three channels, and
+        # use bilinear filtering since clustering doesn't need LANCZOS quality
+        resized_image = image.convert('RGB').resize((self.resize_width, self.resize_height), Image.BILINEAR)
         
-        # Filter out very dark or very light pixels
-        filtered_pixels = self._filter_pixels(pixels)
+        # Wrap the raw RGB bytes directly, skipping PIL's array interface
+        pixels = np.frombuffer(resized_image.tobytes(), dtype=np.uint8, count=self._npix * 3).reshape(-1, 3)
         
-        # If too many pixels were filtered, use original pixels
-        if len(filtered_pixels) < (self.resize_width * self.resize_height * 0.1):
-            logging.warning("Too many pixels filtered out, using original pixels")
-            filtered_pixels = pixels
-        
-        # Choose algorithm based on configuration
-        if self.algorithm.lower() == 'kmeans':
-            colors = self._kmeans_clustering(filtered_pixels)
-        elif self.algorithm.lower() == 'quantile':
-            colors = self._quantile_based(filtered_pixels)
-        elif self.algorithm.lower() == 'histogram':
-            colors = self._histogram_based(np_image)
+        if self._filter_input:
+            # Reduce to weighted unique colors, dropping too dark/light/grey ones
+            samples, weights = self._prepare_weighted_samples(pixels)
+            colors = self._algorithm_fn(samples, weights)
         else:
-            logging.warning(f"Unknown algorithm: {self.algorithm}, falling back to K-means")
-            colors = self._kmeans_clustering(filtered_pixels)
+            colors = self._algorithm_fn(pixels, None)
         
         # Apply color harmony if enabled
         if self.color_harmony:
@@ -76,45 +121,108 @@ class ColorAnalyzer:
         logging.debug(f"Extracted colors: {colors}")
         return colors
     
-    def _filter_pixels(self, pixels):
+    def _quant_buffers(self):
         """
-        Filter out pixels that are too dark or too light
+        Get the calling thread's buffers for quantizing pixels, allocating
+        them on first use
+        
+        Returns:
+            tuple: (quant_buf, key_buf) arrays of shape (npix, 3) and (npix,)
+        """
+        buffers = getattr(self._buffers, 'arrays', None)
+        if buffers is None:
+            buffers = self._buffers.arrays = (
+                np.empty((self._npix, 3), dtype=np.uint32),
+                np.empty(self._npix, dtype=np.uint32)
+            )
+        return buffers
+    
+    def _prepare_weighted_samples(self, pixels):
+        """
+        Quantize pixels to 5 bits per channel, count each resulting color and
+        filter out colors that are too dark, too light or too grey
         
         Args:
             pixels: Numpy array of pixels
             
         Returns:
-            Numpy array of filtered pixels
+            tuple: (samples, weights) with the unique colors as an (N, 3) array
+            and the number of pixels that fell into each of them
         """
-        # Convert RGB to HSV for better filtering
-        hsv_pixels = np.array([colorsys.rgb_to_hsv(r/255, g/255, b/255) for r, g, b in pixels])
+        # Bit-pack the quantized channels into this thread's buffers and
+        # count them in one pass
+        quant_buf, key_buf = self._quant_buffers()
+        q = np.right_shift(pixels, 3, out=quant_buf)
+        keys = np.left_shift(q[:, 0], 10, out=key_buf)
+        keys |= np.left_shift(q[:, 1], 5, out=q[:, 1])
+        keys |= q[:, 2]
+        counts = np.bincount(keys, minlength=1 << 15)
+        unique_keys = np.flatnonzero(counts)
+        weights = counts[unique_keys]
+        samples = np.stack([(unique_keys >> 10) & 31, (unique_keys >> 5) & 31, unique_keys & 31], axis=1) * 8 + 4
+        
+        # Only V and S of HSV are needed for filtering, so skip the hue
+        p = samples.astype(np.float32) * (1 / 255)
+        mx = p.max(axis=1)
+        mn = p.min(axis=1)
+        s = np.where(mx > 0, (mx - mn) / np.maximum(mx, 1e-9), 0)
         
         # Filter based on brightness (V in HSV) and saturation (S in HSV)
-        mask = (hsv_pixels[:, 2] > self.brightness_threshold) & \
-               (hsv_pixels[:, 2] < (1 - self.brightness_threshold)) & \
-               (hsv_pixels[:, 1] > self.saturation_threshold)
+        mask = (mx > self.brightness_threshold) & \
+               (mx < (1 - self.brightness_threshold)) & \
+               (s > self.saturation_threshold)
+        
+        # If too many pixels were filtered, use all colors
+        if weights[mask].sum() < len(pixels) * 0.1:
+            logging.warning("Too many pixels filtered out, using original pixels")
+            return samples, weights
         
-        return pixels[mask]
+        return samples[mask], weights[mask]
     
-    def _kmeans_clustering(self, pixels):
+    def _kmeans_clustering(self, samples, weights):
         """
-        Use K-means clustering to find dominant colors
+        Use weighted K-means clustering to find dominant colors
         
         Args:
-            pixels: Numpy array of pixels
+            samples: Numpy array of unique colors
+            weights: Numpy array with the number of pixels of each color
             
         Returns:
             list: List of dominant colors as (R, G, B) tuples
         """
-        kmeans = KMeans(n_clusters=self.num_colors, random_state=42, n_init=10)
-        kmeans.fit(pixels)
+        # With no more colors than clusters, the colors are the palette;
+        # cycle through them so there are still num_colors entries
+        if len(samples) <= self.num_colors:
+            order = np.argsort(weights)[::-1]
+            colors = [tuple(color) for color in samples[order].astype(int).tolist()]
+            return list(itertools.islice(itertools.cycle(colors), self.num_colors))
+        
+        if NUMBA_AVAILABLE:
+            # Specialized 3-D Lloyd's loop, compiled on first use
+            with _KMEANS_KERNEL_LOCK:
+                centers, labels = _kmeans_d3_numba(samples.astype(np.int64), weights.astype(np.float64),
+                                                   self.num_colors, 50, 42)
+        else:
+            # A single mini-batch run is plenty for palette extraction, and
+            # small clusters are kept rather than randomly reassigned
+            kmeans = MiniBatchKMeans(
+                n_clusters=self.num_colors,
+                init='k-means++',
+                n_init=1,
+                batch_size=self.batch_size,
+                max_iter=50,
+                reassignment_ratio=0.0,
+                random_state=42
+            )
+            # float32 input is used as-is instead of being copied to float64
+            kmeans.fit(samples.astype(np.float32), sample_weight=weights.astype(np.float32))
+            centers, labels = kmeans.cluster_centers_, kmeans.labels_
         
         # Get the colors
-        colors = kmeans.cluster_centers_.astype(int)
+        colors = centers.astype(int)
         
-        # Get cluster sizes to sort colors by dominance
-        labels = kmeans.labels_
-        counts = np.bincount(labels)
+        # Get cluster sizes (in pixels) to sort colors by dominance
+        counts = np.bincount(labels, weights=weights, minlength=self.num_colors)
         
         # Sort colors by cluster size (most dominant first)
         sorted_indices = np.argsort(counts)[::-1]
@@ -123,33 +231,37 @@ class ColorAnalyzer:
         # Convert to list of tuples
         return [tuple(color) for color in sorted_colors]
     
-    def _quantile_based(self, pixels):
+    def _quantile_based(self, samples, weights):
         """
         Use quantile-based approach to find representative colors
         
         Args:
-            pixels: Numpy array of pixels
+            samples: Numpy array of unique colors
+            weights: Numpy array with the number of pixels of each color
             
         Returns:
             list: List of dominant colors as (R, G, B) tuples
         """
-        # Calculate quantiles for each channel
-        colors = []
-        for i in range(self.num_colors):
-            quantile = (i + 1) / (self.num_colors + 1)
-            r = int(np.quantile(pixels[:, 0], quantile))
-            g = int(np.quantile(pixels[:, 1], quantile))
-            b = int(np.quantile(pixels[:, 2], quantile))
-            colors.append((r, g, b))
-        
-        return colors
+        # Sort each channel and accumulate the pixel counts along it, so a
+        # quantile is the first color whose cumulative count reaches it
+        order = np.argsort(samples, axis=0)
+        sorted_samples = np.take_along_axis(samples, order, axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        total = cumulative[-1, 0]
+        
+        # Look up all quantiles of each channel in a single call
+        targets = (np.arange(self.num_colors) + 1) / (self.num_colors + 1) * total
+        values = np.stack([sorted_samples[np.searchsorted(cumulative[:, c], targets), c] for c in range(3)], axis=1)
+        
+        return [tuple(color) for color in values.astype(int).tolist()]
     
-    def _histogram_based(self, image_array):
+    def _histogram_based(self, pixels, weights=None):
         """
         Use color histograms to find dominant colors
         
         Args:
-            image_array: Numpy array of the image
+            pixels: Numpy array of pixels
+            weights: Optional numpy array with the number of pixels of each entry
             
         Returns:
             list: List of dominant colors as (R, G, B) tuples
@@ -157,26 +269,24 @@ class ColorAnalyzer:
         # Reduce color space to make histogram manageable
         bins = 25
         
-        # Create 3D histogram
-        hist, edges = np.histogramdd(
-            image_array.reshape(-1, 3),
-            bins=[bins, bins, bins],
-            range=[(0, 255), (0, 255), (0, 255)]
-        )
+        # Pack each pixel's (R, G, B) bin indices into a single integer and
+        # count them in one pass, which is much cheaper than np.histogramdd
+        bin_indices = np.minimum(pixels.astype(np.uint32) * bins // 255, bins - 1)
+        keys = (bin_indices[:, 0] * bins + bin_indices[:, 1]) * bins + bin_indices[:, 2]
+        hist = np.bincount(keys, weights=weights, minlength=bins ** 3)
         
         # Find the centers of the bins
-        r_centers = (edges[0][:-1] + edges[0][1:]) / 2
-        g_centers = (edges[1][:-1] + edges[1][1:]) / 2
-        b_centers = (edges[2][:-1] + edges[2][1:]) / 2
+        centers = (np.arange(bins) + 0.5) * (255 / bins)
         
-        # Flatten the histogram and get the indices of the top N bins
-        indices = np.argsort(hist.flatten())[-self.num_colors:]
+        # Partially sort to get the top N bins, then order just those by count
+        top = np.argpartition(hist, -self.num_colors)[-self.num_colors:]
+        indices = top[np.argsort(hist[top])[::-1]]
         
         # Convert flat indices to 3D indices
         colors = []
         for idx in indices:
             r_idx, g_idx, b_idx = np.unravel_index(idx, (bins, bins, bins))
-            colors.append((int(r_centers[r_idx]), int(g_centers[g_idx]), int(b_centers[b_idx])))
+            colors.append((int(centers[r_idx]), int(centers[g_idx]), int(centers[b_idx])))
         
         return colors
     
@@ -194,23 +304,36 @@ class ColorAnalyzer:
             return colors
         
         # Convert to HSV for easier manipulation
-        hsv_colors = [colorsys.rgb_to_hsv(r/255, g/255, b/255) for r, g, b in colors]
+        hsv_colors = _rgb_to_hsv_np(np.asarray(colors, dtype=np.float64) / 255)
         
         # Choose a harmony model based on the first color
-        base_hue = hsv_colors[0][0]
+        base_hue = hsv_colors[0, 0]
         harmony_model = self._select_harmony_model(base_hue)
         
         # Apply the harmony model
-        harmonized_hsv = self._apply_harmony_model(hsv_colors, harmony_model)
+        harmonized_hsv = _apply_harmony_model(hsv_colors, harmony_model)
         
         # Convert back to RGB
-        harmonized_rgb = []
-        for h, s, v in harmonized_hsv:
-            r, g, b = colorsys.hsv_to_rgb(h, s, v)
-            harmonized_rgb.append((int(r * 255), int(g * 255), int(b * 255)))
+        harmonized_rgb = [tuple(color) for color in (self._hsv_to_rgb_lut(harmonized_hsv) * 255).astype(int).tolist()]
         
         return harmonized_rgb
     
+    def _hsv_to_rgb_lut(self, hsv):
+        """
+        Convert an array of HSV colors to RGB using the hue lookup table
+        
+        Args:
+            hsv: Numpy array of shape (N, 3) with (H, S, V) values 0-1
+            
+        Returns:
+            Numpy array of shape (N, 3) with RGB values 0-1
+        """
+        # Each channel is linear in S and V for a given hue:
+        # channel = V * (1 - S * (1 - pure_channel(H)))
+        h, s, v = hsv.T
+        pure = self._hue_lut[np.rint(h * _HUE_LUT_SIZE).astype(int) % _HUE_LUT_SIZE]
+        return v[:, None] * (1.0 - s[:, None] * (1.0 - pure))
+    
     def _select_harmony_model(self, base_hue):
         """
         Select a color harmony model based on the base hue
@@ -222,84 +345,195 @@ class ColorAnalyzer:
             str: Harmony model name
         """
         # Randomly select a harmony model with some weighting
-        import random
-        models = ['complementary', 'analogous', 'triadic', 'tetradic', 'monochromatic']
-        weights = [0.2, 0.3, 0.2, 0.1, 0.2]
-        
-        return random.choices(models, weights=weights, k=1)[0]
+        return self._rng.choices(self._HARMONY_MODELS, cum_weights=self._harmony_cum_weights, k=1)[0]
+
+
+def _apply_harmony_model(hsv_colors, model):
+    """
+    Apply a specific harmony model to the colors
+    
+    Args:
+        hsv_colors: Numpy array of (H, S, V) colors
+        model: Harmony model name
+        
+    Returns:
+        Numpy array of harmonized (H, S, V) colors
+    """
+    n = len(hsv_colors)
+    base_h, base_s, base_v = hsv_colors[0]
+    i = np.arange(n)
+    
+    # Every model except monochromatic keeps the base saturation and value
+    result = np.empty((n, 3))
+    result[:, 1] = base_s
+    result[:, 2] = base_v
+    
+    if model == 'complementary':
+        # Alternate between the base hue and its complement (opposite on
+        # the color wheel), drifting a little further with each color
+        offsets = 0.5 * (i & 1) + 0.05 * (i - 1)
+        result[:, 0] = np.mod(base_h + offsets, 1.0)
+        
+    elif model == 'analogous':
+        # Add colors adjacent on the color wheel
+        result[:, 0] = np.mod(base_h + np.mod(i * 0.05, 0.3), 1.0)
     
-    def _apply_harmony_model(self, hsv_colors, model):
+    elif model == 'triadic':
+        # Colors at 120° intervals, with variations for the remaining colors
+        result[:, 0] = np.mod(base_h + (i % 3) / 3 + np.where(i >= 3, (i // 3 + 1) * 0.05, 0), 1.0)
+    
+    elif model == 'tetradic':
+        # Colors at 90° intervals, with variations for the remaining colors
+        result[:, 0] = np.mod(base_h + (i % 4) / 4 + np.where(i >= 4, (i // 4 + 1) * 0.05, 0), 1.0)
+    
+    elif model == 'monochromatic':
+        # Keep the same hue but vary saturation and value
+        result[:, 0] = base_h
+        result[1:, 1] = np.clip(base_s + np.mod(i[1:] * 0.15, 0.6) - 0.3, 0.1, 1.0)
+        result[1:, 2] = np.clip(base_v + np.mod(i[1:] * 0.1, 0.4) - 0.2, 0.2, 0.9)
+    
+    else:
+        return hsv_colors[:1]
+    
+    # Keep the first color unchanged
+    result[0] = hsv_colors[0]
+    return result
+
+
+def harmonize_colors(colors, model):
+    """
+    Apply a specific harmony model to a list of RGB colors
+    
+    Args:
+        colors: List of (R, G, B) color tuples
+        model: Harmony model name
+        
+    Returns:
+        list: List of harmonized colors as (R, G, B) tuples
+    """
+    hsv_colors = _rgb_to_hsv_np(np.asarray(colors, dtype=np.float64) / 255)
+    harmonized_hsv = _apply_harmony_model(hsv_colors, model)
+    return [tuple(color) for color in (_hsv_to_rgb_np(harmonized_hsv) * 255).astype(int).tolist()]
+
+
+def _rgb_to_hsv_np(rgb):
+    """
+    Convert an array of RGB colors to HSV, matching colorsys.rgb_to_hsv
+    
+    Args:
+        rgb: Numpy array of shape (N, 3) with values 0-1
+    
+    Returns:
+        Numpy array of shape (N, 3) with (H, S, V) values 0-1
+    """
+    maxc = rgb.max(axis=1)
+    delta = np.ptp(rgb, axis=1)
+    safe_delta = np.where(delta > 0, delta, 1)
+    
+    r, g, b = ((maxc[:, None] - rgb) / safe_delta[:, None]).T
+    channel = np.argmax(rgb, axis=1)
+    h = np.choose(channel, [b - g, 2.0 + r - b, 4.0 + g - r])
+    h = np.where(delta > 0, np.mod(h / 6.0, 1.0), 0.0)
+    s = np.where(maxc > 0, delta / np.where(maxc > 0, maxc, 1), 0.0)
+    
+    return np.stack([h, s, maxc], axis=1)
+
+
+def _hsv_to_rgb_np(hsv):
+    """
+    Convert an array of HSV colors to RGB, matching colorsys.hsv_to_rgb
+    
+    Args:
+        hsv: Numpy array of shape (N, 3) with (H, S, V) values 0-1
+    
+    Returns:
+        Numpy array of shape (N, 3) with RGB values 0-1
+    """
+    h, s, v = hsv.T
+    sector = np.floor(h * 6.0)
+    f = h * 6.0 - sector
+    sector = sector.astype(int) % 6
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    
+    r = np.choose(sector, [v, q, p, p, t, v])
+    g = np.choose(sector, [t, v, v, q, p, p])
+    b = np.choose(sector, [p, p, t, v, v, q])
+    
+    return np.stack([r, g, b], axis=1)
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _kmeans_d3_numba(samples, weights, k, iters, seed):
         """
-        Apply a specific harmony model to the colors
+        Weighted K-means on RGB samples, specialized for three dimensions
         
         Args:
-            hsv_colors: List of (H, S, V) color tuples
-            model: Harmony model name
-            
+            samples: Numpy array of shape (N, 3) with integer RGB values
+            weights: Numpy array of shape (N,) with the weight of each sample
+            k: Number of clusters
+            iters: Maximum number of Lloyd iterations
+            seed: Random seed for the k-means++ initialization
+        
         Returns:
-            list: List of harmonized (H, S, V) color tuples
+            tuple: (centers, labels) with centers of shape (k, 3) and labels of shape (N,)
         """
-        base_h, base_s, base_v = hsv_colors[0]
-        result = [hsv_colors[0]]  # Keep the first color
-        
-        if model == 'complementary':
-            # Add complementary color (opposite on color wheel)
-            complement_h = (base_h + 0.5) % 1.0
-            result.append((complement_h, base_s, base_v))
+        np.random.seed(seed)
+        n = samples.shape[0]
+        centers = np.empty((k, 3))
+        labels = np.zeros(n, dtype=np.int64)
+        
+        # Weighted k-means++ seeding: pick each new center with probability
+        # proportional to weight times squared distance to the nearest center
+        closest = np.full(n, _FAR_DISTANCE)
+        probs = weights.copy()
+        for c in range(k):
+            cumulative = np.cumsum(probs)
+            idx = min(np.searchsorted(cumulative, np.random.random() * cumulative[-1]), n - 1)
+            for j in range(3):
+                centers[c, j] = samples[idx, j]
+            for i in prange(n):
+                d = 0.0
+                for j in range(3):
+                    diff = samples[i, j] - centers[c, j]
+                    d += diff * diff
+                if d < closest[i]:
+                    closest[i] = d
+                probs[i] = weights[i] * closest[i]
+        
+        for it in range(iters):
+            # Assignment step, parallel over samples
+            changed = 0
+            for i in prange(n):
+                best = 0
+                best_d = _FAR_DISTANCE
+                for c in range(k):
+                    d = 0.0
+                    for j in range(3):
+                        diff = samples[i, j] - centers[c, j]
+                        d += diff * diff
+                    if d < best_d:
+                        best_d = d
+                        best = c
+                if labels[i] != best:
+                    changed += 1
+                labels[i] = best
+            
+            if it > 0 and changed == 0:
+                break
             
-            # Add some variations
-            for i in range(len(hsv_colors) - 2):
-                idx = i % 2
-                h_offset = (i + 1) * 0.05
-                if idx == 0:
-                    h = (base_h + h_offset) % 1.0
-                else:
-                    h = (complement_h + h_offset) % 1.0
-                result.append((h, base_s, base_v))
-                
-        elif model == 'analogous':
-            # Add colors adjacent on the color wheel
-            for i in range(1, len(hsv_colors)):
-                h_offset = (i * 0.05) % 0.3
-                h = (base_h + h_offset) % 1.0
-                result.append((h, base_s, base_v))
-                
-        elif model == 'triadic':
-            # Add colors at 120° intervals
-            for i in range(1, min(3, len(hsv_colors))):
-                h = (base_h + i/3) % 1.0
-                result.append((h, base_s, base_v))
-                
-            # Add variations for remaining colors
-            for i in range(3, len(hsv_colors)):
-                base_idx = i % 3
-                h_offset = ((i // 3) + 1) * 0.05
-                h = (result[base_idx][0] + h_offset) % 1.0
-                result.append((h, base_s, base_v))
-                
-        elif model == 'tetradic':
-            # Add colors at 90° intervals
-            for i in range(1, min(4, len(hsv_colors))):
-                h = (base_h + i/4) % 1.0
-                result.append((h, base_s, base_v))
-                
-            # Add variations for remaining colors
-            for i in range(4, len(hsv_colors)):
-                base_idx = i % 4
-                h_offset = ((i // 4) + 1) * 0.05
-                h = (result[base_idx][0] + h_offset) % 1.0
-                result.append((h, base_s, base_v))
-                
-        elif model == 'monochromatic':
-            # Keep the same hue but vary saturation and value
-            for i in range(1, len(hsv_colors)):
-                s_offset = (i * 0.15) % 0.6 - 0.3
-                v_offset = (i * 0.1) % 0.4 - 0.2
-                
-                s = max(0.1, min(1.0, base_s + s_offset))
-                v = max(0.2, min(0.9, base_v + v_offset))
-                
-                result.append((base_h, s, v))
-        
-        # Ensure we return the right number of colors
-        return result[:len(hsv_colors)] 
\ No newline at end of file
+            # Update step: weighted mean of each cluster
+            sums = np.zeros((k, 3))
+            totals = np.zeros(k)
+            for i in range(n):
+                c = labels[i]
+                totals[c] += weights[i]
+                for j in range(3):
+                    sums[c, j] += weights[i] * samples[i, j]
+            for c in range(k):
+                if totals[c] > 0:
+                    for j in range(3):
+                        centers[c, j] = sums[c, j] / totals[c]
+        
+        return centers, labels
@@ -9,15 +9,23 @@ import time
 import tkinter as tk
 from tkinter import ttk, messagebox, colorchooser
 from configparser import ConfigParser
-from PIL import ImageTk
+from PIL import Image, ImageTk
+
+# Application root directory and the files the GUI uses under it
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_PATH = os.path.join(ROOT_DIR, 'logs', 'app.log')
+CONFIG_PATH = os.path.join(ROOT_DIR, 'config', 'config.ini')
 
 # Add the parent directory to the path so we can import our modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
 
 from src.wallpaper_capture import WallpaperCapture
-from src.color_analyzer import ColorAnalyzer
 from src.light_controller import LightController
-from src.utils import setup_logging, rgb_to_hex, hex_to_rgb, ScreenRegionSelector
+from src.utils import setup_logging, rgb_list_to_hex, hex_to_rgb, ScreenRegionSelector
+
+# Largest size a capture is kept at; both the preview and the color
+# analyzer work from this downsampled copy
+PREVIEW_MAX_SIZE = (800, 600)
 
 
 class WallpaperLightGUI:
@@ -28,18 +36,26 @@ class WallpaperLightGUI:
         self.root.minsize(700, 500)
         
         # Set up logging
-        log_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'app.log')
-        setup_logging(log_path)
+        setup_logging(LOG_PATH)
         
         # Load configuration
-        self.config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'config.ini')
+        self.config_path = CONFIG_PATH
         self.config = self.load_config()
+        self._config_dirty = False
+        self._config_flush_scheduled = False
         
         # Initialize application state
         self.running = False
         self.update_thread = None
+        self._stop_event = threading.Event()
         self.current_colors = []
         self.wallpaper_image = None
+        self._last_status = None
+        self.preview_item = None
+        self._preview_buf = None
+        self._preview_source = None
+        self._preview_size = None
+        self._preview_redraw_pending = None
         self.harmony_type_var = tk.StringVar(value="complementary")
         
         # Add screenshot mode variable
@@ -48,18 +64,24 @@ class WallpaperLightGUI:
         # Create GUI components
         self.create_widgets()
         
+        # Mirror Tk variables into plain attributes so reading them doesn't
+        # need a round-trip into Tcl (or the Tk thread)
+        self.mirror_var(self.harmony_type_var, 'harmony_type')
+        self.mirror_var(self.screenshot_mode, 'use_screenshot')
+        self.mirror_var(self.interval_var, 'interval_text')
+        self.mirror_var(self.full_screen_var, 'full_screen')
+        
         # Initialize components to None (will be created when needed)
         self.wallpaper_capture = None
         self.color_analyzer = None
         self.light_controller = None
         self.color_preview_frames = []
-        self.color_frames = []
         
         # Update status initially
         self.update_status("Ready")
         
-        # Set up periodic UI updates
-        self.root.after(1000, self.update_ui)
+        # Make sure pending configuration changes are written on exit
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_widgets(self):
         # Create a simple interface for now
@@ -79,12 +101,13 @@ class WallpaperLightGUI:
         color_container = ttk.Frame(color_frame)
         color_container.pack(pady=10)
         
-        self.color_frames = []
-        for i in range(5):
-            color_box = tk.Frame(color_container, width=50, height=50, bg="gray")
-            color_box.pack(side="left", padx=5)
-            color_box.pack_propagate(False)
-            self.color_frames.append(color_box)
+        # Draw the color swatches as rectangles on a single canvas
+        self.color_canvas = tk.Canvas(color_container, width=5 * 60, height=50, highlightthickness=0)
+        self.color_canvas.pack()
+        self.color_rects = [
+            self.color_canvas.create_rectangle(i * 60 + 5, 0, i * 60 + 55, 50, fill="gray", outline="")
+            for i in range(5)
+        ]
         
         # Control buttons
         control_frame = ttk.Frame(frame)
@@ -172,6 +195,10 @@ class WallpaperLightGUI:
         
         self.preview_canvas = tk.Canvas(preview_frame, bg="black")
         self.preview_canvas.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        # Redraw the preview when the canvas is resized; new captures
+        # schedule their own redraw
+        self.preview_canvas.bind("<Configure>", self.on_preview_configure)
 
         # Add region selection button
         ttk.Button(
@@ -207,7 +234,8 @@ class WallpaperLightGUI:
                 'algorithm': 'kmeans',
                 'color_harmony': 'true',
                 'brightness_threshold': '0.1',
-                'saturation_threshold': '0.1'
+                'saturation_threshold': '0.1',
+                'batch_size': '1024'
             }
             config['LightController'] = {
                 'type': 'hue',
@@ -224,23 +252,104 @@ class WallpaperLightGUI:
         
         return config
 
+    def mirror_var(self, var, attr):
+        """Keep a plain Python attribute in sync with a Tk variable"""
+        setattr(self, attr, var.get())
+        var.trace_add("write", lambda *args: setattr(self, attr, var.get()))
+
+    def save_config(self):
+        """Mark the configuration as changed and write it out after a short delay"""
+        self._config_dirty = True
+        if not self._config_flush_scheduled:
+            self._config_flush_scheduled = True
+            self.root.after(2000, self.flush_config)
+
+    def flush_config(self):
+        """Write the configuration to config.ini if it has unsaved changes"""
+        self._config_flush_scheduled = False
+        if not self._config_dirty:
+            return
+        
+        try:
+            with open(self.config_path, 'w') as f:
+                self.config.write(f)
+            self._config_dirty = False
+        except Exception as e:
+            logging.error(f"Error saving configuration: {e}")
+
+    def on_close(self):
+        """Stop the application, save the configuration and close the window"""
+        self.stop_application()
+        if self.light_controller:
+            self.light_controller.close()
+        self.flush_config()
+        self.root.destroy()
+
+    def downsample_capture(self, image):
+        """Shrink a captured image once so the preview and analyzer don't each resize the full image"""
+        scale = min(PREVIEW_MAX_SIZE[0] / image.width, PREVIEW_MAX_SIZE[1] / image.height)
+        if scale >= 1:
+            return image
+        
+        new_size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        return image.resize(new_size, Image.BILINEAR, reducing_gap=2.0)
+
+    def call_in_ui(self, func):
+        """Run func on the Tk main thread, directly if already called from it"""
+        if threading.current_thread() is threading.main_thread():
+            func()
+        else:
+            self.root.after(0, func)
+
     def update_status(self, status):
         """Update the status label"""
-        self.status_label.config(text=status)
+        # Repeated statuses would only cause redundant redraws and log lines
+        if status == self._last_status:
+            return
+        self._last_status = status
+        
+        self.call_in_ui(lambda: self.status_label.config(text=status))
         logging.info(status)
 
+    def show_colors(self, colors):
+        """Show the given colors in the color swatches"""
+        for rect, hex_color in zip(self.color_rects, rgb_list_to_hex(colors)):
+            self.color_canvas.itemconfig(rect, fill=hex_color)
+
+    def ensure_components(self, analyzer=True, lights=True):
+        """
+        Create any missing application components; existing ones are kept
+        alive across start/stop so their setup (e.g. bridge connections)
+        only happens once
+        
+        Args:
+            analyzer: Whether the color analyzer is needed
+            lights: Whether the light controller is needed
+        """
+        if self.wallpaper_capture is None:
+            # Wallpapers are decoded straight at about the preview size
+            self.wallpaper_capture = WallpaperCapture(self.config, draft_size=PREVIEW_MAX_SIZE)
+        if analyzer and self.color_analyzer is None:
+            # Imported here so opening the window doesn't load scikit-learn and Numba
+            from src.color_analyzer import ColorAnalyzer
+            self.color_analyzer = ColorAnalyzer(self.config)
+        if lights and self.light_controller is None:
+            self.light_controller = LightController(self.config)
+            # Keep newly discovered lights for the next start
+            if self.light_controller.cache_updated:
+                self.save_config()
+
     def start_application(self):
         """Start the wallpaper light application"""
         if self.running:
             return
             
         try:
-            # Initialize components
-            self.wallpaper_capture = WallpaperCapture(self.config)
-            self.color_analyzer = ColorAnalyzer(self.config)
-            self.light_controller = LightController(self.config)
+            # Initialize components, reusing any kept from an earlier run
+            self.ensure_components()
             
             self.running = True
+            self._stop_event.clear()
             self.update_status("Application running")
             
             # Start update thread
@@ -255,6 +364,7 @@ class WallpaperLightGUI:
     def stop_application(self):
         """Stop the wallpaper light application"""
         self.running = False
+        self._stop_event.set()
         
         if self.update_thread:
             self.update_thread.join(timeout=1.0)
@@ -262,53 +372,55 @@ class WallpaperLightGUI:
         
         self.update_status("Application stopped")
 
+    def run_update(self, force=False):
+        """
+        Capture, analyze and apply colors, then publish the results to the UI
+        
+        Args:
+            force: Send the colors even to lights that should already show them
+        """
+        # Capture wallpaper or screenshot
+        image = self.downsample_capture(self.wallpaper_capture.capture())
+        
+        # Analyze colors
+        self.update_status("Analyzing colors...")
+        colors = self.color_analyzer.analyze(image)
+        
+        # Control lights
+        self.light_controller.set_colors(colors, force=force)
+        
+        # Publish the results only once they are complete, then redraw the
+        # preview and color swatches together on the main thread
+        self.wallpaper_image, self.current_colors = image, colors
+        
+        def refresh():
+            self.update_preview()
+            self.show_colors(colors)
+        
+        self.call_in_ui(refresh)
+
     def update_loop(self):
         """Main update loop for the application"""
         update_interval = self.config.getint('General', 'update_interval', fallback=2)
-        last_update_time = 0
         
         while self.running:
+            # Schedule the next update from when this one started, so time
+            # spent capturing and analyzing counts toward the interval
+            next_update = time.monotonic() + update_interval
             try:
-                current_time = time.time()
-                
-                # Only update if enough time has passed
-                if current_time - last_update_time >= update_interval:
-                    self.update_status("Capturing image...")
-                    
-                    # Capture wallpaper or screenshot
-                    self.wallpaper_image = self.wallpaper_capture.capture()
-                    
-                    # Schedule UI update on main thread
-                    self.root.after(0, self.update_preview)
-                    
-                    self.update_status("Analyzing colors...")
-                    # Analyze colors
-                    self.current_colors = self.color_analyzer.analyze(self.wallpaper_image)
-                    
-                    # Update color preview on main thread
-                    def update_colors():
-                        for i, color in enumerate(self.current_colors):
-                            if i < len(self.color_frames):
-                                hex_color = rgb_to_hex(color)
-                                self.color_frames[i].config(bg=hex_color)
-                    
-                    self.root.after(0, update_colors)
-                    
-                    # Control lights
-                    self.light_controller.set_colors(self.current_colors)
-                    
-                    self.update_status("Colors updated")
-                    
-                    # Update last update time
-                    last_update_time = current_time
+                self.update_status("Capturing image...")
+                self.run_update()
+                self.update_status("Colors updated")
                 
-                # Sleep a short time to prevent CPU hogging
-                time.sleep(0.1)
+                # Sleep until the next update, waking early if stopped
+                if self._stop_event.wait(max(0, next_update - time.monotonic())):
+                    break
                     
             except Exception as e:
                 logging.error(f"Error in update loop: {e}")
                 self.update_status(f"Error: {e}")
-                time.sleep(1)  # Shorter recovery time
+                if self._stop_event.wait(1):  # Shorter recovery time
+                    break
 
     def apply_custom_colors(self):
         """Apply custom colors to the lights"""
@@ -318,7 +430,7 @@ class WallpaperLightGUI:
             
         try:
             # Apply the colors to the lights
-            self.light_controller.set_colors(self.current_colors)
+            self.light_controller.set_colors(self.current_colors, force=True)
             messagebox.showinfo("Colors Applied", "Custom colors have been applied to the lights")
             
         except Exception as e:
@@ -329,8 +441,7 @@ class WallpaperLightGUI:
         """Capture the current wallpaper and analyze colors"""
         if not self.wallpaper_capture or not self.color_analyzer:
             try:
-                self.wallpaper_capture = WallpaperCapture(self.config)
-                self.color_analyzer = ColorAnalyzer(self.config)
+                self.ensure_components(lights=False)
             except Exception as e:
                 logging.error(f"Error initializing components: {e}")
                 messagebox.showerror("Error", f"Failed to initialize components: {e}")
@@ -338,7 +449,8 @@ class WallpaperLightGUI:
         
         try:
             # Capture wallpaper
-            self.wallpaper_image = self.wallpaper_capture.capture()
+            self.wallpaper_image = self.downsample_capture(self.wallpaper_capture.capture())
+            self.update_preview()
             
             # Analyze colors
             self.current_colors = self.color_analyzer.analyze(self.wallpaper_image)
@@ -356,97 +468,21 @@ class WallpaperLightGUI:
             return
             
         try:
-            # Convert to HSV for easier manipulation
-            hsv_colors = [colorsys.rgb_to_hsv(r/255, g/255, b/255) for r, g, b in self.current_colors]
+            from src.color_analyzer import harmonize_colors
             
-            # Get base color
-            base_h, base_s, base_v = hsv_colors[0]
-            harmony_type = self.harmony_type_var.get()
-            
-            # Apply harmony
-            if harmony_type == "complementary":
-                # Add complementary color (opposite on color wheel)
-                complement_h = (base_h + 0.5) % 1.0
-                harmonized_hsv = [(base_h, base_s, base_v), (complement_h, base_s, base_v)]
-                
-                # Add some variations
-                for i in range(len(self.current_colors) - 2):
-                    idx = i % 2
-                    h_offset = (i + 1) * 0.05
-                    if idx == 0:
-                        h = (base_h + h_offset) % 1.0
-                    else:
-                        h = (complement_h + h_offset) % 1.0
-                    harmonized_hsv.append((h, base_s, base_v))
-                    
-            elif harmony_type == "analogous":
-                # Add colors adjacent on the color wheel
-                harmonized_hsv = [(base_h, base_s, base_v)]
-                for i in range(1, len(self.current_colors)):
-                    h_offset = (i * 0.05) % 0.3
-                    h = (base_h + h_offset) % 1.0
-                    harmonized_hsv.append((h, base_s, base_v))
-                    
-            elif harmony_type == "triadic":
-                # Add colors at 120° intervals
-                harmonized_hsv = [(base_h, base_s, base_v)]
-                for i in range(1, min(3, len(self.current_colors))):
-                    h = (base_h + i/3) % 1.0
-                    harmonized_hsv.append((h, base_s, base_v))
-                    
-                # Add variations for remaining colors
-                for i in range(3, len(self.current_colors)):
-                    base_idx = i % 3
-                    h_offset = ((i // 3) + 1) * 0.05
-                    h = (harmonized_hsv[base_idx][0] + h_offset) % 1.0
-                    harmonized_hsv.append((h, base_s, base_v))
-                    
-            elif harmony_type == "tetradic":
-                # Add colors at 90° intervals
-                harmonized_hsv = [(base_h, base_s, base_v)]
-                for i in range(1, min(4, len(self.current_colors))):
-                    h = (base_h + i/4) % 1.0
-                    harmonized_hsv.append((h, base_s, base_v))
-                    
-                # Add variations for remaining colors
-                for i in range(4, len(self.current_colors)):
-                    base_idx = i % 4
-                    h_offset = ((i // 4) + 1) * 0.05
-                    h = (harmonized_hsv[base_idx][0] + h_offset) % 1.0
-                    harmonized_hsv.append((h, base_s, base_v))
-                    
-            elif harmony_type == "monochromatic":
-                # Keep the same hue but vary saturation and value
-                harmonized_hsv = [(base_h, base_s, base_v)]
-                for i in range(1, len(self.current_colors)):
-                    s_offset = (i * 0.15) % 0.6 - 0.3
-                    v_offset = (i * 0.1) % 0.4 - 0.2
-                    
-                    s = max(0.1, min(1.0, base_s + s_offset))
-                    v = max(0.2, min(0.9, base_v + v_offset))
-                    
-                    harmonized_hsv.append((base_h, s, v))
-            
-            # Convert back to RGB
-            harmonized_rgb = []
-            for h, s, v in harmonized_hsv[:len(self.current_colors)]:
-                r, g, b = colorsys.hsv_to_rgb(h, s, v)
-                harmonized_rgb.append((int(r * 255), int(g * 255), int(b * 255)))
-            
-            # Update current colors
-            self.current_colors = harmonized_rgb
+            # Apply harmony to all colors at once
+            harmony_type = self.harmony_type
+            self.current_colors = harmonize_colors(self.current_colors, harmony_type)
             
             # Update UI
-            for i, color in enumerate(self.current_colors):
+            for i, hex_color in enumerate(rgb_list_to_hex(self.current_colors)):
                 if i < len(self.color_preview_frames):
-                    hex_color = rgb_to_hex(color)
                     frame, label, _ = self.color_preview_frames[i]
                     frame.config(bg=hex_color)
                     label.config(text=hex_color)
-                    
-                    # Update color frame in main tab
-                    if i < len(self.color_frames):
-                        self.color_frames[i].config(bg=hex_color)
+            
+            # Update color swatches in main tab
+            self.show_colors(self.current_colors)
             
             messagebox.showinfo("Harmony Applied", f"{harmony_type.capitalize()} harmony has been applied to the colors")
             
@@ -466,12 +502,15 @@ class WallpaperLightGUI:
 
     def toggle_screenshot_mode(self):
         """Toggle between wallpaper and screenshot mode"""
-        use_screenshot = self.screenshot_mode.get()
+        use_screenshot = self.use_screenshot
         self.config.set('WallpaperCapture', 'use_screenshot', str(use_screenshot))
         
+        # The capture component is kept alive, so update it directly
+        if self.wallpaper_capture:
+            self.wallpaper_capture.use_screenshot = use_screenshot
+        
         # Save the configuration
-        with open(self.config_path, 'w') as f:
-            self.config.write(f)
+        self.save_config()
         
         mode_name = "Screenshot" if use_screenshot else "Wallpaper"
         self.update_status(f"Capture mode set to: {mode_name}")
@@ -480,7 +519,7 @@ class WallpaperLightGUI:
         """Start continuous screen capture"""
         # Update the interval from the UI
         try:
-            interval = int(self.interval_var.get())
+            interval = int(self.interval_text)
             if interval < 1:
                 interval = 1
             elif interval > 300:
@@ -489,8 +528,7 @@ class WallpaperLightGUI:
             self.config.set('General', 'update_interval', str(interval))
             
             # Save the configuration
-            with open(self.config_path, 'w') as f:
-                self.config.write(f)
+            self.save_config()
                 
             self.update_status(f"Update interval set to {interval} seconds")
         except ValueError:
@@ -500,11 +538,24 @@ class WallpaperLightGUI:
         self.start_application()
         
         # Update status
-        if self.screenshot_mode.get():
+        if self.use_screenshot:
             self.update_status("Started continuous screenshot capture")
         else:
             self.update_status("Started wallpaper monitoring")
 
+    def on_preview_configure(self, event):
+        """Redraw the preview once the canvas has stopped resizing"""
+        # Dragging the window edge fires many <Configure> events; only the
+        # last one within the delay actually triggers a redraw
+        if self._preview_redraw_pending is not None:
+            self.root.after_cancel(self._preview_redraw_pending)
+        self._preview_redraw_pending = self.root.after(80, self.redraw_preview)
+    
+    def redraw_preview(self):
+        """Run the preview redraw scheduled by on_preview_configure"""
+        self._preview_redraw_pending = None
+        self.update_preview()
+
     def update_preview(self):
         """Update the preview canvas with the current wallpaper/screenshot"""
         if self.wallpaper_image:
@@ -516,6 +567,11 @@ class WallpaperLightGUI:
                 # Skip if canvas is not yet properly sized
                 if canvas_width <= 1 or canvas_height <= 1:
                     return
+                
+                # Skip if neither the image nor the canvas size has changed
+                if self._preview_source is self.wallpaper_image and \
+                        self._preview_size == (canvas_width, canvas_height):
+                    return
                     
                 # Calculate aspect ratio
                 img_width, img_height = self.wallpaper_image.size
@@ -531,28 +587,35 @@ class WallpaperLightGUI:
                     new_width = canvas_width
                     new_height = int(new_width / aspect_ratio)
                 
-                # Resize image
-                resized_img = self.wallpaper_image.resize((new_width, new_height))
-                self.tk_image = ImageTk.PhotoImage(resized_img)
+                # Only allocate a new canvas-sized buffer and PhotoImage when
+                # the canvas size changes
+                if self._preview_size != (canvas_width, canvas_height):
+                    self._preview_buf = Image.new("RGB", (canvas_width, canvas_height))
+                    self.tk_image = ImageTk.PhotoImage(self._preview_buf)
+                    
+                    # Reuse the canvas item instead of recreating it
+                    if self.preview_item is None:
+                        self.preview_item = self.preview_canvas.create_image(
+                            canvas_width // 2, canvas_height // 2,
+                            image=self.tk_image, anchor="center"
+                        )
+                    else:
+                        self.preview_canvas.coords(self.preview_item, canvas_width // 2, canvas_height // 2)
+                        self.preview_canvas.itemconfig(self.preview_item, image=self.tk_image)
+                
+                # Resize image and paste it centered into the buffer
+                resized_img = self.wallpaper_image.resize((new_width, new_height), Image.BILINEAR)
+                self._preview_buf.paste((0, 0, 0), (0, 0, canvas_width, canvas_height))
+                self._preview_buf.paste(resized_img, ((canvas_width - new_width) // 2, (canvas_height - new_height) // 2))
+                
+                # Blit the buffer into the existing PhotoImage in place
+                self.tk_image.paste(self._preview_buf)
                 
-                # Clear canvas and draw image
-                self.preview_canvas.delete("all")
-                self.preview_canvas.create_image(
-                    canvas_width // 2, canvas_height // 2,
-                    image=self.tk_image, anchor="center"
-                )
+                self._preview_source = self.wallpaper_image
+                self._preview_size = (canvas_width, canvas_height)
             except Exception as e:
                 logging.error(f"Error updating preview: {e}")
 
-    def update_ui(self):
-        """Periodic UI update function"""
-        # Update preview if we have an image
-        if self.wallpaper_image:
-            self.update_preview()
-        
-        # Schedule next update
-        self.root.after(1000, self.update_ui)
-
     def force_update(self):
         """Force an immediate update"""
         if not self.running:
@@ -566,28 +629,7 @@ class WallpaperLightGUI:
         """Perform the forced update"""
         try:
             self.update_status("Forcing update...")
-            
-            # Capture wallpaper or screenshot
-            self.wallpaper_image = self.wallpaper_capture.capture()
-            
-            # Schedule UI update on main thread
-            self.root.after(0, self.update_preview)
-            
-            # Analyze colors
-            self.current_colors = self.color_analyzer.analyze(self.wallpaper_image)
-            
-            # Update color preview on main thread
-            def update_colors():
-                for i, color in enumerate(self.current_colors):
-                    if i < len(self.color_frames):
-                        hex_color = rgb_to_hex(color)
-                        self.color_frames[i].config(bg=hex_color)
-            
-            self.root.after(0, update_colors)
-            
-            # Control lights
-            self.light_controller.set_colors(self.current_colors)
-            
+            self.run_update(force=True)
             self.update_status("Forced update completed")
             
         except Exception as e:
@@ -599,7 +641,7 @@ class WallpaperLightGUI:
         # Initialize wallpaper capture if needed
         if not self.wallpaper_capture:
             try:
-                self.wallpaper_capture = WallpaperCapture(self.config)
+                self.ensure_components(analyzer=False, lights=False)
             except Exception as e:
                 logging.error(f"Error initializing wallpaper capture: {e}")
                 messagebox.showerror("Error", f"Failed to initialize wallpaper capture: {e}")
@@ -623,11 +665,10 @@ class WallpaperLightGUI:
                 self.full_screen_var.set(False)
                 
                 # Save the configuration
-                with open(self.config_path, 'w') as f:
-                    self.config.write(f)
+                self.save_config()
                     
                 # Capture a test screenshot with the new region
-                self.wallpaper_image = self.wallpaper_capture.capture()
+                self.wallpaper_image = self.downsample_capture(self.wallpaper_capture.capture())
                 self.update_preview()
                 
                 self.update_status(f"Screen region selected: {region}")
@@ -644,19 +685,18 @@ class WallpaperLightGUI:
         """Toggle between full screen and region capture"""
         if not self.wallpaper_capture:
             try:
-                self.wallpaper_capture = WallpaperCapture(self.config)
+                self.ensure_components(analyzer=False, lights=False)
             except Exception as e:
                 logging.error(f"Error initializing wallpaper capture: {e}")
                 messagebox.showerror("Error", f"Failed to initialize wallpaper capture: {e}")
                 return
         
-        if self.full_screen_var.get():
+        if self.full_screen:
             # Switch to full screen
             self.wallpaper_capture.set_capture_region(None)
             
             # Save the configuration
-            with open(self.config_path, 'w') as f:
-                self.config.write(f)
+            self.save_config()
             
             self.update_status("Switched to full screen capture")
         else:
@@ -1,9 +1,47 @@
 """
 Module for controlling smart lights
 """
+import json
 import logging
+import socket
 import time
-import colorsys
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+
+from src.utils import rgb_to_hex, rgb_array_to_xy, rgb_array_to_hsbk
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+# Upper bound on concurrent requests to the lights, so a bridge isn't flooded
+MAX_CONCURRENT_REQUESTS = 8
+
+# Seconds to wait for the Hue bridge to answer a light update
+HUE_REQUEST_TIMEOUT = 2.0
+
+
+def local_subnet():
+    """
+    Get the /24 prefix of this machine's LAN address, used to tell networks apart
+    
+    Returns:
+        str: Address prefix such as "192.168.1", or "" if it can't be determined
+    """
+    try:
+        # Connecting a UDP socket sends nothing; it only picks the outgoing interface
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(('10.255.255.255', 1))
+            address = sock.getsockname()[0]
+    except OSError:
+        try:
+            address = socket.gethostbyname(socket.gethostname())
+        except OSError:
+            return ""
+    return address.rsplit('.', 1)[0]
 
 
 class LightController:
@@ -17,12 +55,50 @@ class LightController:
             config: ConfigParser object with application configuration
         """
         self.config = config
-        self.light_type = config.get('LightController', 'type', fallback='hue')
+        # Normalized once here so the per-light code can compare it directly
+        self.light_type = config.get('LightController', 'type', fallback='hue').strip().lower()
         self.transition_time = config.getfloat('LightController', 'transition_time', fallback=1.0)
+        # The lights fade themselves; Hue takes the time in deciseconds, the others in milliseconds
+        self._transition_ds = int(round(self.transition_time * 10))
+        self._transition_ms = int(round(self.transition_time * 1000))
         self.demo_mode = config.getboolean('LightController', 'demo_mode', fallback=False)
+        self._executor = None
+        
+        # Keep-alive HTTP session for Hue light updates, set up by _init_hue
+        self._hue_session = None
+        self._hue_url = None
+        
+        # Last state sent to each light, by light index, so unchanged lights
+        # aren't sent the same command again
+        self._last_state = {}
+        
+        # Set when discovery results were stored in the config and should be saved
+        self.cache_updated = False
         
         logging.info(f"Initializing light controller for {self.light_type} lights")
         
+        self._init_lights()
+        
+        # Resolve the per-light update method once, instead of comparing the
+        # light type for every light on every update
+        if self.demo_mode:
+            self._apply_color = self._apply_demo
+        else:
+            self._apply_color = {
+                'hue': self._apply_hue,
+                'lifx': self._apply_lifx,
+                'yeelight': self._apply_yeelight,
+            }[self.light_type]
+        
+        # Worker threads that send the per-light updates concurrently
+        if not self.demo_mode and len(self.lights) > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=min(MAX_CONCURRENT_REQUESTS, len(self.lights)),
+                thread_name_prefix="light"
+            )
+    
+    def _init_lights(self):
+        """Connect to the configured lights, falling back to demo mode"""
         # Use demo mode if configured or if real lights fail to initialize
         if self.demo_mode:
             logging.info("Running in demo mode - no actual lights will be controlled")
@@ -31,11 +107,11 @@ class LightController:
             
         # Initialize the appropriate light controller
         try:
-            if self.light_type.lower() == 'hue':
+            if self.light_type == 'hue':
                 self._init_hue()
-            elif self.light_type.lower() == 'lifx':
+            elif self.light_type == 'lifx':
                 self._init_lifx()
-            elif self.light_type.lower() == 'yeelight':
+            elif self.light_type == 'yeelight':
                 self._init_yeelight()
             else:
                 logging.warning(f"Unsupported light type: {self.light_type}")
@@ -53,6 +129,15 @@ class LightController:
             self.demo_mode = True
             self.lights = ["Demo Light 1", "Demo Light 2", "Demo Light 3"]
     
+    def close(self):
+        """Stop the worker threads and close the connections used to send light updates"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._hue_session is not None:
+            self._hue_session.close()
+            self._hue_session = None
+    
     def _init_hue(self):
         """Initialize Philips Hue controller"""
         try:
@@ -70,6 +155,13 @@ class LightController:
                 self.bridge.connect()
                 self.lights = self.bridge.lights
                 logging.info(f"Connected to Hue bridge at {bridge_ip} with {len(self.lights)} lights")
+                
+                # phue opens a new connection per request; send the light
+                # updates over a pooled keep-alive session instead
+                if REQUESTS_AVAILABLE:
+                    self._hue_session = requests.Session()
+                    self._hue_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+                    self._hue_url = f"http://{bridge_ip}/api/{self.bridge.username}"
             except Exception as e:
                 logging.error(f"Failed to connect to Hue bridge: {e}")
                 self.lights = []
@@ -84,8 +176,20 @@ class LightController:
             import lifxlan
             
             self.lifx = lifxlan.LifxLAN()
+            
+            # Reuse the lights found last time if they all still answer,
+            # skipping the broadcast discovery and its wait
+            cached = self._load_cached_lights('LIFX')
+            if cached:
+                lights = [lifxlan.Light(mac, ip) for mac, ip in cached]
+                if self._all_reachable(lights, lambda light: light.get_power()):
+                    self.lights = lights
+                    logging.info(f"Using {len(self.lights)} cached LIFX lights")
+                    return
+            
             self.lights = self.lifx.get_lights()
             logging.info(f"Discovered {len(self.lights)} LIFX lights")
+            self._save_cached_lights('LIFX', [[light.get_mac_addr(), light.get_ip_addr()] for light in self.lights])
             
         except ImportError:
             logging.error("lifxlan package not installed. Install with: pip install lifxlan")
@@ -96,20 +200,94 @@ class LightController:
         try:
             from yeelight import discover_bulbs, Bulb
             
-            discovered_bulbs = discover_bulbs()
-            self.lights = [Bulb(bulb["ip"]) for bulb in discovered_bulbs]
-            logging.info(f"Discovered {len(self.lights)} Yeelight bulbs")
+            # Reuse the bulbs found last time if they all still answer
+            cached = self._load_cached_lights('Yeelight')
+            bulbs = [Bulb(ip) for ip in cached] if cached else []
+            if bulbs and self._all_reachable(bulbs, lambda bulb: bulb.get_properties()):
+                self.lights = bulbs
+                logging.info(f"Using {len(self.lights)} cached Yeelight bulbs")
+            else:
+                discovered_bulbs = discover_bulbs()
+                self.lights = [Bulb(bulb["ip"]) for bulb in discovered_bulbs]
+                logging.info(f"Discovered {len(self.lights)} Yeelight bulbs")
+                self._save_cached_lights('Yeelight', [bulb["ip"] for bulb in discovered_bulbs])
+            
+            # Music mode keeps one connection open per bulb and lifts the
+            # bulb's command rate limit, so color changes aren't throttled
+            for bulb in self.lights:
+                try:
+                    bulb.start_music()
+                except Exception as e:
+                    logging.warning(f"Could not enable music mode on Yeelight {bulb}: {e}")
             
         except ImportError:
             logging.error("yeelight package not installed. Install with: pip install yeelight")
             self.lights = []
     
-    def set_colors(self, colors):
+    def _load_cached_lights(self, section):
+        """
+        Get the light addresses cached in the config by an earlier discovery
+        
+        Args:
+            section: Config section of the light type
+            
+        Returns:
+            list: Cached addresses, or None if there are none for the current network
+        """
+        if not self.config.has_option(section, 'cached_lights'):
+            return None
+        if self.config.get(section, 'cached_subnet', fallback=None) != local_subnet():
+            logging.info(f"Network changed, ignoring cached {section} lights")
+            return None
+        
+        try:
+            return json.loads(self.config.get(section, 'cached_lights', raw=True))
+        except ValueError:
+            logging.warning(f"Failed to parse cached {section} lights")
+            return None
+    
+    def _save_cached_lights(self, section, addresses):
+        """
+        Store discovered light addresses in the config for the next start
+        
+        Args:
+            section: Config section of the light type
+            addresses: JSON-serializable list of light addresses
+        """
+        if not addresses:
+            return
+        if not self.config.has_section(section):
+            self.config.add_section(section)
+        self.config.set(section, 'cached_lights', json.dumps(addresses))
+        self.config.set(section, 'cached_subnet', local_subnet())
+        self.cache_updated = True
+    
+    def _all_reachable(self, lights, probe):
+        """
+        Check in parallel that every light answers a request
+        
+        Args:
+            lights: Light objects to check
+            probe: Function that queries one light and raises if it doesn't answer
+            
+        Returns:
+            bool: True if all lights answered
+        """
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(lights))) as pool:
+            try:
+                list(pool.map(probe, lights))
+                return True
+            except Exception as e:
+                logging.info(f"Cached lights not reachable, rediscovering: {e}")
+                return False
+    
+    def set_colors(self, colors, force=False):
         """
         Set lights to the given colors
         
         Args:
             colors: List of (R, G, B) color tuples
+            force: Send the colors even to lights that should already show them
         """
         if not self.lights:
             logging.warning("No lights available to control")
@@ -120,51 +298,155 @@ class LightController:
             return
         
         # Distribute colors among lights
-        for i, light in enumerate(self.lights):
-            # Use modulo to cycle through colors if we have more lights than colors
-            color = colors[i % len(colors)]
-            self._set_light_color(light, color, i)
+        # Use modulo to cycle through colors if we have more lights than colors
+        assignments = [tuple(colors[i % len(colors)]) for i in range(len(self.lights))]
+        
+        # Convert all colors to the lights' native format in one pass
+        values = self._convert_colors(assignments)
+        
+        # Only lights whose state changes need a command
+        if force:
+            pending = list(range(len(self.lights)))
+        else:
+            pending = [i for i, value in enumerate(values) if self._last_state.get(i) != value]
+        if not pending:
+            logging.debug("Lights already show these colors, nothing to send")
+            return
+        
+        # When every light gets the same color, update them all at once
+        if not self.demo_mode and len(pending) == len(self.lights) and len(set(assignments)) == 1:
+            if self._set_all_lights_color(assignments[0], values[0]):
+                return
+        
+        # Overlap the network round-trips instead of waiting on each light in
+        # turn; errors are logged per light by _set_light_color. The pool is
+        # read once since close() may run on another thread meanwhile
+        executor = self._executor
+        futures = []
+        for i in pending:
+            if executor is not None:
+                try:
+                    futures.append(executor.submit(self._set_light_color, self.lights[i], assignments[i], values[i], i))
+                    continue
+                except RuntimeError:
+                    # The pool was shut down during this update; send the rest directly
+                    executor = None
+            self._set_light_color(self.lights[i], assignments[i], values[i], i)
+        wait(futures)
     
-    def _set_light_color(self, light, color, index):
+    def _convert_colors(self, colors):
         """
-        Set a specific light to a color
+        Convert RGB colors to the format the lights take
         
         Args:
-            light: Light object
-            color: (R, G, B) color tuple
-            index: Light index for logging
+            colors: List of (R, G, B) color tuples
+            
+        Returns:
+            List with an xy tuple per color for Hue, an HSBK tuple per color
+            for LIFX, or the colors unchanged for other light types
         """
-        r, g, b = color
-        
-        # In demo mode, just log the color change
         if self.demo_mode:
-            hex_color = f"#{r:02x}{g:02x}{b:02x}"
-            logging.info(f"Demo mode: Set light {index} ({light}) to color {hex_color}")
-            return
+            return colors
+        
+        if self.light_type == 'hue':
+            rgb = np.asarray(colors, dtype=np.float64) / 255.0
+            return [tuple(xy) for xy in rgb_array_to_xy(rgb).round(4).tolist()]
+        elif self.light_type == 'lifx':
+            return [tuple(hsbk) for hsbk in rgb_array_to_hsbk(colors).tolist()]
+        return colors
+    
+    def _set_all_lights_color(self, color, value):
+        """
+        Set every light to the same color with a single group/broadcast request
+        
+        Args:
+            color: (R, G, B) color tuple
+            value: The color converted by _convert_colors
             
+        Returns:
+            bool: True if the update was sent, False if the light type has no
+            batched form and the lights have to be set one by one
+        """
         try:
-            if self.light_type.lower() == 'hue':
-                # Convert RGB to Hue color format
-                from phue import rgb_to_xy
-                xy = rgb_to_xy(r, g, b)
-                light.xy = xy
-                light.brightness = 254  # Max brightness
-                logging.debug(f"Set Hue light {index} to color {color}")
+            if self.light_type == 'hue':
+                # Group 0 is the bridge's built-in group of all lights
+                self._put_hue('groups/0/action', {'xy': value, 'bri': 254, 'transitiontime': self._transition_ds})
+                logging.debug(f"Set all Hue lights to color {color}")
                 
-            elif self.light_type.lower() == 'lifx':
-                # LIFX uses HSBK (Hue, Saturation, Brightness, Kelvin)
-                import colorsys
-                h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-                # Convert to LIFX ranges
-                hue = int(h * 65535)
-                saturation = int(s * 65535)
-                brightness = int(v * 65535)
-                light.set_color([hue, saturation, brightness, 3500])
-                logging.debug(f"Set LIFX light {index} to color {color}")
+            elif self.light_type == 'lifx':
+                # One broadcast frame, without waiting for acknowledgements
+                self.lifx.set_color_all_lights(value, duration=self._transition_ms, rapid=True)
+                logging.debug(f"Set all LIFX lights to color {color}")
                 
-            elif self.light_type.lower() == 'yeelight':
-                light.set_rgb(r, g, b)
-                logging.debug(f"Set Yeelight {index} to color {color}")
+            else:
+                return False
                 
         except Exception as e:
-            logging.error(f"Failed to set light {index} to color {color}: {e}") 
\ No newline at end of file
+            logging.warning(f"Failed to set all lights to color {color}, setting them one by one: {e}")
+            return False
+        
+        self._last_state = dict.fromkeys(range(len(self.lights)), value)
+        return True
+    
+    def _set_light_color(self, light, color, value, index):
+        """
+        Set a specific light to a color
+        
+        Args:
+            light: Light object
+            color: (R, G, B) color tuple
+            value: The color converted by _convert_colors
+            index: Light index for logging
+        """
+        try:
+            self._apply_color(light, color, value, index)
+        except Exception as e:
+            logging.error(f"Failed to set light {index} to color {color}: {e}")
+            return
+        
+        self._last_state[index] = value
+    
+    def _apply_demo(self, light, color, value, index):
+        """In demo mode, just log the color change"""
+        logging.info(f"Demo mode: Set light {index} ({light}) to color {rgb_to_hex(color)}")
+    
+    def _apply_hue(self, light, color, value, index):
+        """Set a Philips Hue light to an xy color"""
+        # Color, brightness and fade time in one request, at max brightness
+        self._put_hue(f'lights/{light.light_id}/state', {'xy': value, 'bri': 254, 'transitiontime': self._transition_ds})
+        logging.debug(f"Set Hue light {index} to color {color}")
+    
+    def _put_hue(self, path, body):
+        """
+        Send a state change to the Hue bridge
+        
+        Args:
+            path: Resource path below the user's API root, e.g. "lights/1/state"
+            body: State to set
+        """
+        if self._hue_session is None:
+            self.bridge.request('PUT', f"/api/{self.bridge.username}/{path}", body)
+            return
+        
+        response = self._hue_session.put(f"{self._hue_url}/{path}", json=body, timeout=HUE_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        
+        # The bridge reports failures as error entries in a 200 response
+        errors = [item['error']['description'] for item in response.json() if 'error' in item]
+        if errors:
+            raise RuntimeError("; ".join(errors))
+    
+    def _apply_lifx(self, light, color, value, index):
+        """Set a LIFX light to an HSBK (Hue, Saturation, Brightness, Kelvin) color"""
+        # Fire and forget: don't block on the bulb's acknowledgement
+        light.set_color(value, duration=self._transition_ms, rapid=True)
+        logging.debug(f"Set LIFX light {index} to color {color}")
+    
+    def _apply_yeelight(self, light, color, value, index):
+        """Set a Yeelight bulb to an RGB color"""
+        r, g, b = color
+        if self._transition_ms > 0:
+            light.set_rgb(r, g, b, effect="smooth", duration=self._transition_ms)
+        else:
+            light.set_rgb(r, g, b, effect="sudden")
+        logging.debug(f"Set Yeelight {index} to color {color}")
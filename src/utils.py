@@ -1,14 +1,24 @@
 """
 Utility functions for the Wallpaper Light application
 """
+import atexit
+import functools
 import logging
+import logging.handlers
 import os
+import queue
+import string
 import sys
 import colorsys
+import numpy as np
 import tkinter as tk
 from PIL import Image, ImageTk
 
 
+# Background listener that writes queued log records, started by setup_logging
+_log_listener = None
+
+
 def setup_logging(log_path=None):
     """
     Set up logging configuration
@@ -16,18 +26,30 @@ def setup_logging(log_path=None):
     Args:
         log_path: Path to log file
     """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    
     # Create logs directory if it doesn't exist
     if log_path:
         os.makedirs(os.path.dirname(log_path), exist_ok=True)
     
+    # Log calls only put records on a queue; a listener thread does the
+    # console and file I/O so callers such as the Tk thread never block on it
+    log_queue = queue.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(
+        log_queue,
+        logging.StreamHandler(),
+        logging.FileHandler(log_path) if log_path else logging.NullHandler()
+    )
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    
     # Configure logging
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler(log_path) if log_path else logging.NullHandler()
-        ]
+        handlers=[logging.handlers.QueueHandler(log_queue)]
     )
 
 
@@ -39,10 +61,34 @@ def rgb_to_hex(rgb):
         rgb: (R, G, B) tuple with values 0-255
         
     Returns:
-        Hex color string (e.g., "#FF0000" for red)
+        Hex color string (e.g., "#ff0000" for red)
+    """
+    # int() so NumPy uint8 channels don't overflow when shifted, and so the
+    # cache sees the same key whatever integer type came in
+    r, g, b = map(int, rgb)
+    return _packed_rgb_to_hex(r, g, b)
+
+
+@functools.lru_cache(maxsize=4096)
+def _packed_rgb_to_hex(r, g, b):
+    """Format plain-int RGB channels as a hex color string"""
+    return '#%06x' % ((r << 16) | (g << 8) | b)
+
+
+def rgb_list_to_hex(colors):
+    """
+    Convert a list of RGB tuples to hex color strings
+    
+    Args:
+        colors: List of (R, G, B) tuples or (N, 3) array with values 0-255
+        
+    Returns:
+        List of hex color strings
     """
-    r, g, b = rgb
-    return f"#{r:02x}{g:02x}{b:02x}"
+    # Pack all colors into 24-bit integers at once, then format each one
+    rgb = np.asarray(colors, dtype=np.uint32).reshape(-1, 3)
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    return ['#%06x' % value for value in packed.tolist()]
 
 
 def hex_to_rgb(hex_color):
@@ -54,9 +100,89 @@ def hex_to_rgb(hex_color):
         
     Returns:
         (R, G, B) tuple with values 0-255
+        
+    Raises:
+        ValueError: If the string isn't six hex digits after the '#'
     """
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    digits = hex_color.lstrip('#')
+    if len(digits) != 6 or not all(c in string.hexdigits for c in digits):
+        raise ValueError(f"Invalid hex color: {hex_color!r}")
+    value = int(digits, 16)
+    return (value >> 16, (value >> 8) & 0xff, value & 0xff)
+
+
+# Linear sRGB to CIE XYZ matrix (wide gamut, D65) used by the Hue developer docs
+_RGB_TO_XYZ = np.array([
+    [0.664511, 0.154324, 0.162028],
+    [0.283881, 0.668433, 0.047685],
+    [0.000088, 0.072310, 0.986039],
+])
+
+# Chromaticity of the D65 white point, used for black where xy is undefined
+_D65_WHITE_XY = (0.3127, 0.3290)
+
+
+def rgb_array_to_xy(rgb):
+    """
+    Convert an array of RGB colors to CIE 1931 xy coordinates for Hue lights
+    
+    Points outside a bulb's gamut are left to the bridge, which clamps them
+    to the nearest color the bulb can show.
+    
+    Args:
+        rgb: (N, 3) array of RGB values in the 0-1 range
+        
+    Returns:
+        (N, 2) array of xy coordinates
+    """
+    rgb = np.clip(np.asarray(rgb, dtype=np.float64).reshape(-1, 3), 0.0, 1.0)
+    
+    # Undo the sRGB gamma curve, then project to XYZ
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ _RGB_TO_XYZ.T
+    total = xyz.sum(axis=1, keepdims=True)
+    
+    xy = np.tile(_D65_WHITE_XY, (len(xyz), 1))
+    np.divide(xyz[:, :2], total, out=xy, where=total > 0)
+    return xy
+
+
+def rgb_array_to_hsbk(rgb, kelvin=3500):
+    """
+    Convert an array of 8-bit RGB colors to LIFX HSBK values
+    
+    Uses integer arithmetic only, so brightness is exact (255 maps to 65535)
+    and no intermediate float arrays are created.
+    
+    Args:
+        rgb: (N, 3) array of RGB values in the 0-255 range
+        kelvin: Color temperature to use for every color
+        
+    Returns:
+        (N, 4) uint16 array of (hue, saturation, brightness, kelvin) with
+        hue, saturation and brightness scaled to 0-65535
+    """
+    rgb = np.asarray(rgb, dtype=np.int64).reshape(-1, 3)
+    r, g, b = rgb.T
+    
+    maxc = rgb.max(axis=1)
+    delta = maxc - rgb.min(axis=1)
+    
+    # Hue as a fraction of six sectors of delta each, picked per color the
+    # same way as colorsys.rgb_to_hsv, then wrapped into 0..6*delta
+    sectors = 6 * np.maximum(delta, 1)
+    h = np.select(
+        [delta == 0, maxc == r, maxc == g],
+        [0, g - b, 2 * delta + b - r],
+        4 * delta + r - g
+    ) % sectors
+    
+    hsbk = np.empty((len(rgb), 4), dtype=np.uint16)
+    hsbk[:, 0] = h * 65535 // sectors
+    hsbk[:, 1] = delta * 65535 // np.maximum(maxc, 1)
+    hsbk[:, 2] = maxc * 257
+    hsbk[:, 3] = kelvin
+    return hsbk
 
 
 class ScreenRegionSelector:
@@ -70,8 +196,10 @@ class ScreenRegionSelector:
         self.start_y = 0
         self.current_x = 0
         self.current_y = 0
-        self.rect_id = None
+        self.rubber_band = None
+        self.drag_pending = None  # after_idle id of a queued rubber band update
         self.selected_region = None  # (x1, y1, x2, y2)
+        self.scale = 1.0  # Displayed size relative to the screenshot
         
     def open_selector(self, screenshot):
         """
@@ -100,6 +228,20 @@ class ScreenRegionSelector:
         )
         self.canvas.pack(fill=tk.BOTH, expand=True)
         
+        # Shrink the screenshot to the window before converting it to a
+        # PhotoImage; on HiDPI screens the capture has more pixels than Tk
+        # can show, and every one of them would go through Tk's image buffer
+        self.scale = min(
+            1.0,
+            self.selection_window.winfo_screenwidth() / screenshot.width,
+            self.selection_window.winfo_screenheight() / screenshot.height
+        )
+        if self.scale < 1.0:
+            screenshot = screenshot.resize(
+                (int(screenshot.width * self.scale), int(screenshot.height * self.scale)),
+                Image.BILINEAR
+            )
+        
         # Convert the screenshot to a PhotoImage
         self.tk_image = ImageTk.PhotoImage(screenshot)
         
@@ -132,23 +274,44 @@ class ScreenRegionSelector:
         """Handle mouse press event"""
         self.start_x = self.canvas.canvasx(event.x)
         self.start_y = self.canvas.canvasy(event.y)
+        self.current_x = self.start_x
+        self.current_y = self.start_y
         
-        # Create a rectangle if it doesn't exist
-        if self.rect_id:
-            self.canvas.delete(self.rect_id)
+        # The selection is shown by a small translucent window moved over
+        # the screenshot, so dragging never repaints the screenshot itself
+        if self.rubber_band is None:
+            self.rubber_band = tk.Toplevel(self.selection_window)
+            self.rubber_band.overrideredirect(True)
+            self.rubber_band.configure(bg="red")
+            self.rubber_band.attributes('-alpha', 0.3)
+            self.rubber_band.attributes('-topmost', True)
         
-        self.rect_id = self.canvas.create_rectangle(
-            self.start_x, self.start_y, self.start_x, self.start_y,
-            outline="red", width=2
-        )
+        self.update_rubber_band()
         
     def on_drag(self, event):
         """Handle mouse drag event"""
         self.current_x = self.canvas.canvasx(event.x)
         self.current_y = self.canvas.canvasy(event.y)
         
-        # Update the rectangle
-        self.canvas.coords(self.rect_id, self.start_x, self.start_y, self.current_x, self.current_y)
+        # Coalesce a burst of motion events into one update once Tk is idle
+        if self.drag_pending is None:
+            self.drag_pending = self.selection_window.after_idle(self.update_rubber_band)
+    
+    def update_rubber_band(self):
+        """Move the rubber band window over the current selection"""
+        self.drag_pending = None
+        if self.rubber_band is None or not self.rubber_band.winfo_exists():
+            return
+        
+        x1 = int(min(self.start_x, self.current_x))
+        y1 = int(min(self.start_y, self.current_y))
+        width = max(1, int(abs(self.current_x - self.start_x)))
+        height = max(1, int(abs(self.current_y - self.start_y)))
+        
+        # Canvas coordinates are relative to the canvas, the window geometry to the screen
+        left = self.canvas.winfo_rootx() + x1
+        top = self.canvas.winfo_rooty() + y1
+        self.rubber_band.geometry(f"{width}x{height}+{left}+{top}")
         
     def on_release(self, event):
         """Handle mouse release event"""
@@ -161,13 +324,21 @@ class ScreenRegionSelector:
         x2 = max(self.start_x, self.current_x)
         y2 = max(self.start_y, self.current_y)
         
-        # Save the selected region
-        self.selected_region = (int(x1), int(y1), int(x2), int(y2))
+        # Save the selected region, in screenshot pixels
+        self.selected_region = tuple(int(v / self.scale) for v in (x1, y1, x2, y2))
         
         # Close the window
-        self.selection_window.destroy()
+        self.close_window()
         
     def on_cancel(self, event):
         """Handle cancel event"""
         self.selected_region = None
-        self.selection_window.destroy() 
\ No newline at end of file
+        self.close_window()
+    
+    def close_window(self):
+        """Cancel any queued rubber band update and close the selection window"""
+        if self.drag_pending is not None:
+            self.selection_window.after_cancel(self.drag_pending)
+            self.drag_pending = None
+        self.rubber_band = None
+        self.selection_window.destroy()
@@ -1,33 +1,93 @@
 """
 Module for capturing the current desktop wallpaper
 """
+import ctypes
+import io
 import logging
 import os
 import platform
-import tempfile
-from PIL import Image
+import subprocess
+from PIL import Image, ImageGrab
+
+try:
+    import mss
+    MSS_AVAILABLE = True
+except ImportError:
+    MSS_AVAILABLE = False
+
+# Direct desktop APIs, so looking up the wallpaper doesn't start a process
+try:
+    from AppKit import NSWorkspace, NSScreen
+    APPKIT_AVAILABLE = True
+except ImportError:
+    APPKIT_AVAILABLE = False
+
+try:
+    import gi
+    gi.require_version('Gio', '2.0')
+    from gi.repository import Gio
+    GIO_AVAILABLE = True
+except (ImportError, ValueError):
+    GIO_AVAILABLE = False
+
+# pyautogui is only used for Windows screenshots, and importing it on other
+# platforms can fail without a display
+PYAUTOGUI_AVAILABLE = False
+if platform.system() == "Windows":
+    try:
+        import pyautogui
+        PYAUTOGUI_AVAILABLE = True
+    except ImportError:
+        pass
+
+# GSettings schema holding the GNOME wallpaper
+GNOME_BACKGROUND_SCHEMA = 'org.gnome.desktop.background'
 
 
 class WallpaperCapture:
     """Class to capture the current desktop wallpaper"""
     
-    def __init__(self, config):
+    def __init__(self, config, draft_size=None):
         """
         Initialize the wallpaper capture module
         
         Args:
             config: ConfigParser object with application configuration
+            draft_size: Smallest (width, height) callers need; large JPEG
+                wallpapers are decoded at a reduced scale no smaller than this
         """
         self.config = config
+        self.draft_size = draft_size
         self.system = platform.system()
         self.use_screenshot = config.getboolean('WallpaperCapture', 'use_screenshot', fallback=False)
         self.capture_region = None
         
+        # Pick the platform's wallpaper and screenshot methods once
+        dispatch = {
+            "Windows": (self._capture_windows, self._capture_screenshot_windows),
+            "Darwin": (self._capture_macos, self._capture_screenshot_macos),
+            "Linux": (self._capture_linux, self._capture_screenshot_linux),
+        }
+        if self.system not in dispatch:
+            raise NotImplementedError(f"Unsupported operating system: {self.system}")
+        self._capture_wallpaper, self._capture_screenshot_native = dispatch[self.system]
+        
+        # Last decoded wallpaper as (path, mtime, size, image), reused until the file changes
+        self._wallpaper_cache = None
+        
+        # GSettings only aborts on a missing schema, so check it exists first
+        self._gnome_background = None
+        if GIO_AVAILABLE and self.system == "Linux":
+            source = Gio.SettingsSchemaSource.get_default()
+            if source is not None and source.lookup(GNOME_BACKGROUND_SCHEMA, True) is not None:
+                self._gnome_background = Gio.Settings.new(GNOME_BACKGROUND_SCHEMA)
+        
         # Try to load saved region
         if self.config.has_option('WallpaperCapture', 'region'):
             region_str = self.config.get('WallpaperCapture', 'region')
             try:
-                self.capture_region = tuple(map(int, region_str.split(',')))
+                x1, y1, x2, y2 = map(int, region_str.split(','))
+                self.capture_region = (x1, y1, x2, y2)
                 logging.info(f"Loaded capture region: {self.capture_region}")
             except:
                 logging.warning("Failed to parse saved region, using full screen")
@@ -43,15 +103,7 @@ class WallpaperCapture:
         """
         if self.use_screenshot:
             return self.capture_screenshot()
-            
-        if self.system == "Windows":
-            return self._capture_windows()
-        elif self.system == "Darwin":  # macOS
-            return self._capture_macos()
-        elif self.system == "Linux":
-            return self._capture_linux()
-        else:
-            raise NotImplementedError(f"Unsupported operating system: {self.system}")
+        return self._capture_wallpaper()
     
     def capture_screenshot(self):
         """
@@ -62,27 +114,15 @@ class WallpaperCapture:
         """
         logging.debug("Capturing screenshot")
         
-        # Capture full screenshot first
-        if self.system == "Windows":
-            full_screenshot = self._capture_screenshot_windows()
-        elif self.system == "Darwin":  # macOS
-            full_screenshot = self._capture_screenshot_macos()
-        elif self.system == "Linux":
-            full_screenshot = self._capture_screenshot_linux()
-        else:
-            raise NotImplementedError(f"Unsupported operating system for screenshots: {self.system}")
-            
-        # If we have a region, crop the screenshot
-        if self.capture_region and len(self.capture_region) == 4:
+        # MSS reads the raw frame buffer directly and can grab just the region
+        if MSS_AVAILABLE:
             try:
-                x1, y1, x2, y2 = self.capture_region
-                cropped = full_screenshot.crop((x1, y1, x2, y2))
-                logging.debug(f"Cropped screenshot to region {self.capture_region}")
-                return cropped
+                return self._capture_screenshot_mss()
             except Exception as e:
-                logging.error(f"Failed to crop screenshot: {e}")
-                
-        return full_screenshot
+                logging.warning(f"MSS screenshot failed, falling back: {e}")
+        
+        # Otherwise have the platform tool capture just the region
+        return self._capture_screenshot_native(self.capture_region)
     
     def set_capture_region(self, region):
         """
@@ -91,7 +131,7 @@ class WallpaperCapture:
         Args:
             region: (x1, y1, x2, y2) tuple or None for full screen
         """
-        self.capture_region = region
+        self.capture_region = tuple(region) if region else None
         
         # Save the region to config
         if region:
@@ -102,49 +142,110 @@ class WallpaperCapture:
             
         logging.info(f"Set capture region to {region}")
     
-    def _capture_screenshot_windows(self):
-        """Capture screenshot on Windows"""
-        try:
-            import pyautogui
+    def _load_wallpaper(self, path):
+        """
+        Open a wallpaper file, reusing the decoded image while the file is unchanged
+        
+        Args:
+            path: Path to the wallpaper image
+            
+        Returns:
+            PIL.Image: A copy of the decoded wallpaper
+        """
+        stat = os.stat(path)
+        cache = self._wallpaper_cache
+        if cache is None or cache[:3] != (path, stat.st_mtime_ns, stat.st_size):
+            image = Image.open(path)
+            # Let the JPEG decoder scale down while decoding, which also keeps
+            # the cached copy small; this is a no-op for other formats
+            if self.draft_size:
+                image.draft('RGB', self.draft_size)
+            image.load()
+            cache = self._wallpaper_cache = (path, stat.st_mtime_ns, stat.st_size, image)
+            logging.debug(f"Decoded wallpaper {path}")
+        
+        # Callers get their own copy so they can't modify the cached image
+        return cache[3].copy()
+    
+    def _capture_screenshot_mss(self):
+        """Capture screenshot of the primary monitor, or just the capture region, using MSS"""
+        # MSS handles can't be shared between threads and hold a display
+        # connection until closed, so open one per grab
+        with mss.mss() as sct:
+            monitor = sct.monitors[1]
+            if self.capture_region:
+                x1, y1, x2, y2 = self.capture_region
+                monitor = {
+                    'left': monitor['left'] + x1,
+                    'top': monitor['top'] + y1,
+                    'width': x2 - x1,
+                    'height': y2 - y1
+                }
+            
+            shot = sct.grab(monitor)
+        
+        return Image.frombytes('RGB', shot.size, shot.bgra, 'raw', 'BGRX')
+    
+    def _capture_screenshot_windows(self, region=None):
+        """
+        Capture screenshot on Windows
+        
+        Args:
+            region: (x1, y1, x2, y2) tuple to capture, or None for the full screen
+        """
+        if PYAUTOGUI_AVAILABLE:
+            if region:
+                x1, y1, x2, y2 = region
+                return pyautogui.screenshot(region=(x1, y1, x2 - x1, y2 - y1))
             screenshot = pyautogui.screenshot()
             return screenshot
-        except ImportError:
-            logging.error("pyautogui not installed. Install with: pip install pyautogui")
-            # Fallback to PIL-based screenshot if available
-            try:
-                from PIL import ImageGrab
-                screenshot = ImageGrab.grab()
-                return screenshot
-            except Exception as e:
-                logging.error(f"Failed to capture screenshot: {e}")
-                # Return a blank image as fallback
-                return Image.new('RGB', (800, 600), color='black')
+        
+        logging.error("pyautogui not installed. Install with: pip install pyautogui")
+        # Fallback to PIL-based screenshot if available
+        try:
+            screenshot = ImageGrab.grab(bbox=region)
+            return screenshot
+        except Exception as e:
+            logging.error(f"Failed to capture screenshot: {e}")
+            # Return a blank image as fallback
+            return Image.new('RGB', (800, 600), color='black')
     
-    def _capture_screenshot_macos(self):
-        """Capture screenshot on macOS"""
-        import subprocess
+    def _capture_screenshot_macos(self, region=None):
+        """
+        Capture screenshot on macOS
         
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            tmp_path = tmp.name
+        Args:
+            region: (x1, y1, x2, y2) tuple to capture, or None for the full screen
+        """
+        # Write an uncompressed BMP to stdout and decode it from memory, so
+        # there is no temporary file and no PNG encode/decode
+        cmd = ['screencapture', '-x', '-t', 'bmp']
+        if region:
+            x1, y1, x2, y2 = region
+            cmd += ['-R', f"{x1},{y1},{x2 - x1},{y2 - y1}"]
         
-        subprocess.run(['screencapture', '-x', tmp_path], check=True)
-        return Image.open(tmp_path)
+        proc = subprocess.run(cmd + ['/dev/stdout'], check=True, capture_output=True)
+        return Image.open(io.BytesIO(proc.stdout))
     
-    def _capture_screenshot_linux(self):
-        """Capture screenshot on Linux"""
-        import subprocess
+    def _capture_screenshot_linux(self, region=None):
+        """
+        Capture screenshot on Linux
         
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            tmp_path = tmp.name
+        Args:
+            region: (x1, y1, x2, y2) tuple to capture, or None for the full screen
+        """
+        # Write an uncompressed PPM to stdout and decode it from memory, so
+        # there is no temporary file and no PNG encode/decode
+        cmd = ['import', '-window', 'root']
+        if region:
+            x1, y1, x2, y2 = region
+            cmd += ['-crop', f"{x2 - x1}x{y2 - y1}+{x1}+{y1}"]
         
-        subprocess.run(['import', '-window', 'root', tmp_path], check=True)
-        return Image.open(tmp_path)
+        proc = subprocess.run(cmd + ['ppm:-'], check=True, capture_output=True)
+        return Image.open(io.BytesIO(proc.stdout))
     
     def _capture_windows(self):
         """Capture wallpaper on Windows"""
-        import ctypes
-        from ctypes import wintypes
-        
         SPI_GETDESKWALLPAPER = 0x0073
         MAX_PATH = 260
         
@@ -159,46 +260,53 @@ class WallpaperCapture:
         wallpaper_path = path_buffer.value
         logging.debug(f"Windows wallpaper path: {wallpaper_path}")
         
-        return Image.open(wallpaper_path)
+        return self._load_wallpaper(wallpaper_path)
     
     def _capture_macos(self):
         """Capture wallpaper on macOS"""
-        import subprocess
+        wallpaper_path = None
+        
+        # Ask AppKit directly when PyObjC is installed
+        if APPKIT_AVAILABLE:
+            url = NSWorkspace.sharedWorkspace().desktopImageURLForScreen_(NSScreen.mainScreen())
+            if url is not None:
+                wallpaper_path = url.path()
         
-        script = '''
-        tell application "System Events"
-            tell every desktop
-                get picture
+        if not wallpaper_path:
+            script = '''
+            tell application "System Events"
+                tell every desktop
+                    get picture
+                end tell
             end tell
-        end tell
-        '''
+            '''
+            
+            proc = subprocess.Popen(['osascript', '-e', script], stdout=subprocess.PIPE)
+            output, _ = proc.communicate()
+            wallpaper_path = output.decode('utf-8').strip()
         
-        proc = subprocess.Popen(['osascript', '-e', script], stdout=subprocess.PIPE)
-        output, _ = proc.communicate()
-        wallpaper_path = output.decode('utf-8').strip()
         logging.debug(f"macOS wallpaper path: {wallpaper_path}")
         
-        return Image.open(wallpaper_path)
+        return self._load_wallpaper(wallpaper_path)
     
     def _capture_linux(self):
         """Capture wallpaper on Linux"""
-        import subprocess
-        
         # Try to get wallpaper path from GNOME
         try:
-            cmd = ['gsettings', 'get', 'org.gnome.desktop.background', 'picture-uri']
-            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-            output, _ = proc.communicate()
-            wallpaper_path = output.decode('utf-8').strip().replace("'file://", "").rstrip("'")
+            if self._gnome_background is not None:
+                # Read the setting in-process; this also decodes %-escapes in the URI
+                uri = self._gnome_background.get_string('picture-uri')
+                wallpaper_path = Gio.File.new_for_uri(uri).get_path()
+            else:
+                cmd = ['gsettings', 'get', GNOME_BACKGROUND_SCHEMA, 'picture-uri']
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+                output, _ = proc.communicate()
+                wallpaper_path = output.decode('utf-8').strip().replace("'file://", "").rstrip("'")
             
             logging.debug(f"Linux wallpaper path: {wallpaper_path}")
-            return Image.open(wallpaper_path)
+            return self._load_wallpaper(wallpaper_path)
             
         except Exception as e:
             logging.error(f"Failed to get Linux wallpaper: {e}")
-            # Fallback to a screenshot
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                tmp_path = tmp.name
-            
-            subprocess.run(['import', '-window', 'root', tmp_path])
-            return Image.open(tmp_path) 
\ No newline at end of file
+            # Fallback to a screenshot, through MSS when it is available
+            return self.capture_screenshot()